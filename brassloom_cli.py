@@ -5,9 +5,12 @@ brassloom_cli.py
 Usage:
   python brassloom_cli.py --days 60 --gsu /path/to/GSU_Cayuse_Lite.xlsx
 """
-import argparse, os, subprocess, sys
+import argparse, os
 HERE = os.path.dirname(__file__)
 
+import brassloom_harvest
+import brassloom_sync_gsu
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--days", type=int, default=60)
@@ -17,21 +20,16 @@ def main():
     ap.add_argument("--sync_filter", default="")  # default uses config keywords
     args = ap.parse_args()
 
-    # Harvest
-    harvester = os.path.join(HERE, "brassloom_harvest.py")
-    cmd = [sys.executable, harvester, "--out", args.out, "--days", str(args.days), "--keywords", args.keywords]
-    print("Running:", " ".join(cmd))
-    subprocess.check_call(cmd)
+    # Harvest (in-process; keeps the deduped list so sync can skip re-reading the JSON)
+    harvest_ns = argparse.Namespace(out=args.out, days=args.days, keywords=args.keywords)
+    print(f"Harvesting (days={args.days}) -> {args.out}")
+    ops = brassloom_harvest.run(harvest_ns)
 
     # Sync
-    syncer = os.path.join(HERE, "brassloom_sync_gsu.py")
-    cmd2 = [sys.executable, syncer, "--ops", args.out, "--wb", args.gsu]
-    if args.sync_filter:
-        cmd2 += ["--filter", args.sync_filter]
-    else:
-        cmd2 += ["--all"]
-    print("Running:", " ".join(cmd2))
-    subprocess.check_call(cmd2)
+    sync_ns = argparse.Namespace(ops=args.out, wb=args.gsu,
+                                 filter=args.sync_filter, all=not args.sync_filter)
+    print(f"Syncing {len(ops)} items -> {args.gsu}")
+    brassloom_sync_gsu.run(sync_ns, ops=ops)
 
 if __name__ == "__main__":
     main()
@@ -16,36 +16,83 @@ Note:
 - Requires: requests, feedparser
 - Internet access must be available from your machine.
 """
-import argparse, datetime, json, re, sys
+import argparse, concurrent.futures, datetime, hashlib, json, os, re, sys
 from typing import List, Dict
 import requests
 import feedparser
 
+try:
+    from cachecontrol import CacheControl
+    from cachecontrol.caches.file_cache import FileCache
+except ImportError:
+    CacheControl = None
+
+try:
+    import ijson
+    import ijson.common
+except ImportError:
+    ijson = None
+
+try:
+    import ciso8601
+except ImportError:
+    ciso8601 = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def parse_iso(s: str) -> datetime.datetime:
+    # ciso8601 parses ISO-8601 in C, ~50x faster than fromisoformat on old Pythons
+    if ciso8601 is not None:
+        return ciso8601.parse_datetime(s)
+    return datetime.datetime.fromisoformat(s)
+
 DEFAULT_KEYWORDS = ["HBCU","MSI","minority serving","Hispanic-Serving","HSI","Tribal","TCU","Alaska Native","Native Hawaiian","Black","broadening participation","EPSCoR"]
 
-def within_days(date_str: str, days: int) -> bool:
-    if not date_str:
-        return True
+# Conditional-GET sidecar: URL -> {etag, modified, items}
+HTTP_CACHE_PATH = os.path.expanduser("~/.brassloom_http_cache.json")
+
+def load_http_cache() -> Dict:
+    try:
+        with open(HTTP_CACHE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_http_cache(cache: Dict):
     try:
-        dt = datetime.datetime.fromisoformat(date_str[:10])
-    except ValueError:
-        return True
-    return (datetime.datetime.utcnow() - dt).days <= days
-
-def score_item(item: Dict, keywords: List[str]) -> int:
-    text = " ".join([str(item.get(k,"")) for k in ["title","description","eligibility","agency","source"]]).lower()
-    score = 0
-    for kw in keywords:
-        if kw.lower() in text:
-            score += 10
+        with open(HTTP_CACHE_PATH, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+    except OSError:
+        pass
+
+def opp_key(o: Dict) -> bytes:
+    """Stable 8-byte identity hash over the fields that define a duplicate."""
+    ident = json.dumps({k: o.get(k) for k in ("url", "id", "title")}, sort_keys=True)
+    return hashlib.blake2b(ident.encode(), digest_size=8).digest()
+
+# Precompiled against already-lowercased text, so no re.I pass is needed
+_HBCU_RE = re.compile(r'\bhbcu\b')
+_MSI_RE = re.compile(r'\bmsi\b')
+
+def score_item(item: Dict, kw_re: "re.Pattern", now: datetime.datetime = None) -> int:
+    if now is None:
+        now = datetime.datetime.utcnow()
+    text = " ".join((str(item.get("title","")), str(item.get("description","")),
+                     str(item.get("eligibility","")), str(item.get("agency","")),
+                     str(item.get("source","")))).lower()
+    # One C-level pass over the text; each distinct keyword hit counts once
+    score = 10 * len(set(kw_re.findall(text)))
     # Boost for HBCU/MSI exact
-    if re.search(r'\bHBCU\b', text, re.I): score += 20
-    if re.search(r'\bMSI\b', text, re.I): score += 15
+    if _HBCU_RE.search(text): score += 20
+    if _MSI_RE.search(text): score += 15
     # Time urgency boost
     if item.get("close_date"):
         try:
-            cdt = datetime.datetime.fromisoformat(item["close_date"][:10])
-            days_left = (cdt - datetime.datetime.utcnow()).days
+            cdt = parse_iso(item["close_date"][:10])
+            days_left = (cdt - now).days
             if 0 <= days_left <= 30:
                 score += 10
             elif 31 <= days_left <= 60:
@@ -54,22 +101,23 @@ def score_item(item: Dict, keywords: List[str]) -> int:
             pass
     return score
 
-def fetch_grants_gov(days: int, keywords: List[str]) -> List[Dict]:
+GRANTS_GOV_PAGE_SIZE = 500
+
+def fetch_grants_gov(session: requests.Session, days: int, keywords: List[str]) -> List[Dict]:
     url = "https://www.grants.gov/api/v2/search/search2"
-    # Query last N days and include keyword terms
+    # Keyword terms plus a server-side date floor, so the API only returns
+    # (and we only transfer) opportunities opened in the last N days.
     query = " OR ".join([f'\"{k}\"' for k in keywords])
-    params = {
-        "startRecordNum": 0,
+    base_params = {
         "oppStatuses": "forecasted|posted",
         "sortBy": "openDate|desc",
-        "keyword": query
+        "keyword": query,
+        "openDate": (datetime.datetime.utcnow() - datetime.timedelta(days=days)).strftime("%m/%d/%Y"),
+        "rows": GRANTS_GOV_PAGE_SIZE
     }
-    r = requests.get(url, params=params, timeout=30)
-    r.raise_for_status()
-    data = r.json()
-    out = []
-    for opp in data.get("opportunities", []):
-        itm = {
+
+    def project(opp: Dict) -> Dict:
+        return {
             "id": opp.get("opportunityNumber") or opp.get("opportunityId"),
             "source": "Grants.gov",
             "title": opp.get("title"),
@@ -82,12 +130,70 @@ def fetch_grants_gov(days: int, keywords: List[str]) -> List[Dict]:
             "tags": opp.get("category", []),
             "description": opp.get("synopsis","")[:1500]
         }
-        if within_days(itm.get("posted_date",""), days):
-            out.append(itm)
+
+    def fetch_page(start: int):
+        """Fetch one page; returns (projected items, hitCount or None)."""
+        params = dict(base_params, startRecordNum=start)
+        r = session.get(url, params=params, stream=True, timeout=30)
+        r.raise_for_status()
+        hits = []
+        if ijson is not None:
+            # Stream opportunity-by-opportunity instead of materializing the
+            # whole response as one dict tree; memory stays bounded to one
+            # item, and hitCount is picked off the same event stream.
+            r.raw.decode_content = True
+            def events():
+                for prefix, event, value in ijson.parse(r.raw):
+                    if prefix == "hitCount" and event == "number":
+                        hits.append(value)
+                    yield prefix, event, value
+            page = [project(o) for o in ijson.common.items(events(), "opportunities.item")]
+        else:
+            data = r.json()
+            if data.get("hitCount") is not None:
+                hits.append(data["hitCount"])
+            page = [project(o) for o in data.get("opportunities", [])]
+        return page, (int(hits[0]) if hits else None)
+
+    def fetch_page_safe(start: int) -> List[Dict]:
+        try:
+            return fetch_page(start)[0]
+        except Exception as e:
+            print(f"[warn] Grants.gov page at record {start} failed: {e}", file=sys.stderr)
+            return []
+
+    # First page alone; a failure here propagates like the baseline single
+    # request, and most keyword queries fit in one page anyway.
+    out, hit_count = fetch_page(0)
+    if not out or hit_count is None or hit_count <= len(out):
+        return out
+    # Page to hitCount, stepping by the page size the server actually
+    # honored (it may cap rows below what we asked for). Remaining pages
+    # fetch concurrently; a failed page is warned about and skipped
+    # without discarding the rest.
+    step = len(out)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as ex:
+        for page in ex.map(fetch_page_safe, range(step, hit_count, step)):
+            out += page
     return out
 
-def fetch_rss(feed_url: str, source_name: str) -> List[Dict]:
-    d = feedparser.parse(feed_url)
+def fetch_rss(session: requests.Session, feed_url: str, source_name: str, cache: Dict = None) -> List[Dict]:
+    # Fetch through the shared session so feeds reuse TCP/TLS connections.
+    # Conditional GET: send ETag/Last-Modified from the sidecar so unchanged
+    # feeds come back as a bodyless 304 and we reuse the cached items.
+    cached = (cache or {}).get(feed_url, {})
+    headers = {}
+    if cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached.get("modified"):
+        headers["If-Modified-Since"] = cached["modified"]
+    r = session.get(feed_url, headers=headers, timeout=30)
+    if r.status_code == 304 and "items" in cached:
+        return cached["items"]
+    r.raise_for_status()
+    # Descriptions are never rendered as HTML, so skip feedparser's
+    # sanitizer and relative-URI resolution passes over every entry.
+    d = feedparser.parse(r.content, sanitize_html=False, resolve_relative_uris=False)
     out = []
     for e in d.entries:
         posted = ""
@@ -110,63 +216,87 @@ def fetch_rss(feed_url: str, source_name: str) -> List[Dict]:
             "description": e.get("summary","")
         }
         out.append(itm)
+    if cache is not None:
+        cache[feed_url] = {"etag": r.headers.get("ETag", ""),
+                           "modified": r.headers.get("Last-Modified", ""),
+                           "items": out}
     return out
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--out", default="opportunities.json")
-    ap.add_argument("--days", type=int, default=90)
-    ap.add_argument("--keywords", default=",".join(DEFAULT_KEYWORDS))
-    args = ap.parse_args()
+def run(args):
     keywords = [k.strip() for k in args.keywords.split(",") if k.strip()]
+    # One alternation matches every keyword in a single scan per text
+    kw_re = re.compile("|".join(re.escape(k) for k in keywords), re.I)
 
     all_items = []
+    session = requests.Session()
+    http_cache = load_http_cache()
+    # Grants.gov responses go through cachecontrol (when installed) so
+    # If-None-Match/If-Modified-Since revalidation is handled automatically.
+    if CacheControl is not None:
+        try:
+            api_session = CacheControl(session, cache=FileCache(os.path.expanduser("~/.brassloom_cache")))
+        except ImportError:
+            # FileCache needs the cachecontrol[filecache] extra (filelock)
+            api_session = session
+    else:
+        api_session = session
 
-    # Grants.gov
-    try:
-        all_items += fetch_grants_gov(args.days, keywords)
-    except Exception as e:
-        print(f"[warn] Grants.gov fetch failed: {e}", file=sys.stderr)
-
-    # NIH Guide FOAs RSS (global feed; filter via keywords)
-    nih_feeds = [
-        "https://grants.nih.gov/grants/guide/rss/nih-guide.xml"
+    # RSS feeds are global; their results get filtered through the keywords below.
+    rss_feeds = [
+        ("https://grants.nih.gov/grants/guide/rss/nih-guide.xml", "NIH Guide"),   # NIH Guide FOAs
+        ("https://www.nsf.gov/rss/rss_www_funding.xml", "NSF Funding"),           # NSF funding
     ]
-    for url in nih_feeds:
-        try:
-            items = fetch_rss(url, "NIH Guide")
-            all_items += [i for i in items if any(kw.lower() in (i["title"]+" "+i["description"]).lower() for kw in keywords)]
-        except Exception as e:
-            print(f"[warn] NIH RSS failed: {e}", file=sys.stderr)
 
-    # NSF funding RSS
-    try:
-        nsf_feed = "https://www.nsf.gov/rss/rss_www_funding.xml"
-        items = fetch_rss(nsf_feed, "NSF Funding")
-        all_items += [i for i in items if any(kw.lower() in (i["title"]+" "+i["description"]).lower() for kw in keywords)]
-    except Exception as e:
-        print(f"[warn] NSF RSS failed: {e}", file=sys.stderr)
+    # Fire all network fetches concurrently; total wall time is the slowest request.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as ex:
+        futures = {ex.submit(fetch_grants_gov, api_session, args.days, keywords): ("Grants.gov", False)}
+        for url, source in rss_feeds:
+            futures[ex.submit(fetch_rss, session, url, source, http_cache)] = (source, True)
+        for fut in concurrent.futures.as_completed(futures):
+            source, is_rss = futures[fut]
+            try:
+                items = fut.result()
+            except Exception as e:
+                print(f"[warn] {source} fetch failed: {e}", file=sys.stderr)
+                continue
+            if is_rss:
+                items = [i for i in items if kw_re.search(i["title"]+" "+i["description"])]
+            all_items += items
+
+    save_http_cache(http_cache)
 
     # Score and sort
+    now = datetime.datetime.utcnow()
     for itm in all_items:
-        itm["hbcu_msi_score"] = score_item(itm, keywords)
+        itm["hbcu_msi_score"] = score_item(itm, kw_re, now)
 
-    # De-duplicate by URL
-    seen = set()
-    deduped = []
+    # De-duplicate by identity hash (url/id/title); dict keeps first-seen order
+    keyed = {}
     for i in all_items:
-        key = i.get("url") or i.get("id")
-        if key in seen: 
-            continue
-        seen.add(key)
-        deduped.append(i)
+        keyed.setdefault(opp_key(i), i)
+    deduped = list(keyed.values())
 
     deduped.sort(key=lambda x: x.get("hbcu_msi_score",0), reverse=True)
 
-    with open(args.out, "w", encoding="utf-8") as f:
-        json.dump(deduped, f, indent=2)
+    if orjson is not None:
+        # orjson serializes straight to UTF-8 bytes, ~5-10x faster than stdlib json
+        with open(args.out, "wb") as f:
+            f.write(orjson.dumps(deduped, option=orjson.OPT_INDENT_2))
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(deduped, f, indent=2)
 
     print(f"Wrote {len(deduped)} items to {args.out}")
+    return deduped
+
+def main(args=None):
+    if args is None:
+        ap = argparse.ArgumentParser()
+        ap.add_argument("--out", default="opportunities.json")
+        ap.add_argument("--days", type=int, default=90)
+        ap.add_argument("--keywords", default=",".join(DEFAULT_KEYWORDS))
+        args = ap.parse_args()
+    return run(args)
 
 if __name__ == "__main__":
     main()
@@ -7,22 +7,53 @@ Usage:
   python brassloom_sync_gsu.py --ops opportunities.json --wb GSU_Cayuse_Lite.xlsx --all
   python brassloom_sync_gsu.py --ops opportunities.json --wb GSU_Cayuse_Lite.xlsx --filter "HBCU,MSI"
 """
-import argparse, datetime, json, os, re
+import argparse, datetime, functools, hashlib, itertools, json, os, re, zipfile
+import xml.etree.ElementTree as ET
+from collections import namedtuple
 from typing import List, Dict
-from openpyxl import load_workbook
+from openpyxl import Workbook, load_workbook
 from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.datavalidation import DataValidation
 import yaml
 
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+try:
+    import ciso8601
+except ImportError:
+    ciso8601 = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "brassloom_config.yaml")
 
+# libyaml-backed loader when available (10-20x faster than pure-Python SafeLoader)
+try:
+    _YAML_LOADER = yaml.CSafeLoader
+except AttributeError:
+    _YAML_LOADER = yaml.SafeLoader
+
+@functools.lru_cache(maxsize=1)
 def load_config():
     with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
+        return yaml.load(f, Loader=_YAML_LOADER)
 
 def parse_date(s: str):
     if not s:
         return None
     s = s[:10]
+    # Fast path: harvested dates are ISO-8601, which ciso8601 parses in C
+    if ciso8601 is not None:
+        try:
+            return ciso8601.parse_datetime(s).date()
+        except ValueError:
+            pass
     for fmt in ["%Y-%m-%d", "%m/%d/%Y", "%Y/%m/%d"]:
         try:
             return datetime.datetime.strptime(s, fmt).date()
@@ -31,44 +62,73 @@ def parse_date(s: str):
     return None
 
 def next_id(existing_ids: List[str], prefix="GSU-P-"):
-    nums = []
-    for i in existing_ids:
-        m = re.match(rf"{re.escape(prefix)}(\d+)", str(i))
-        if m: 
-            try: nums.append(int(m.group(1)))
-            except: pass
-    nxt = (max(nums) + 1) if nums else 1
-    return f"{prefix}{nxt:04d}"
+    """Return a callable yielding fresh sequential IDs after the existing max."""
+    pat = re.compile(rf"{re.escape(prefix)}(\d+)")
+    nums = [int(m.group(1)) for i in existing_ids if (m := pat.match(str(i)))]
+    counter = itertools.count((max(nums) + 1) if nums else 1)
+    return lambda: f"{prefix}{next(counter):04d}"
 
 def next_task_id(existing_ids: List[str]):
-    nums = []
-    for i in existing_ids:
-        m = re.match(r"TSK-(\d+)", str(i))
-        if m:
-            try: nums.append(int(m.group(1)))
-            except: pass
-    nxt = (max(nums) + 1) if nums else 1
-    return lambda : f"TSK-{(nums.append(nums[-1]+1) or nums[-1]) if nums else (nums.append(1) or 1):04d}"
+    return next_id(existing_ids, "TSK-")
+
+def opp_key(opp_id, title) -> bytes:
+    """Stable 8-byte identity hash from the fields both the workbook and
+    the harvested items carry (FundingOpportunity id + normalized title)."""
+    ident = json.dumps({"id": str(opp_id or ""), "title": str(title or "").strip().lower()}, sort_keys=True)
+    return hashlib.blake2b(ident.encode(), digest_size=8).digest()
+
+_FEDERAL_RE = re.compile(r"national science foundation|nih|health|grants\.gov|nasa|nsf|department of|dod|doe|usda|epa", re.I)
+_STATE_RE = re.compile(r"board of regents|\bstate\b", re.I)
 
 def sponsor_type_from_agency(agency: str) -> str:
     if not agency: return ""
-    agency_low = agency.lower()
-    if any(k in agency_low for k in ["national science foundation","nih","health","grants.gov","nasa","nsf","department of","dod","doe","usda","epa","nsf funding","nih guide"]):
+    if _FEDERAL_RE.search(agency):
         return "Federal"
-    if "board of regents" in agency_low or "state" in agency_low:
+    if _STATE_RE.search(agency):
         return "State"
     return "Nonprofit"
 
+# mechanism_map comes from config, so the alternation is compiled per map and cached
+_MECH_CACHE = {}
+
+def _mechanism_re(mechanism_map: Dict):
+    key = tuple(mechanism_map.items())
+    cached = _MECH_CACHE.get(key)
+    if cached is None:
+        pattern = re.compile("|".join(f"({re.escape(k)})" for k in mechanism_map), re.I)
+        cached = _MECH_CACHE[key] = (pattern, list(mechanism_map.values()))
+    return cached
+
 def mechanism_from_source(item: Dict, cfg: Dict) -> str:
     src = (item.get("source") or item.get("agency") or "").strip()
-    for k, v in cfg.get("mechanism_map", {}).items():
-        if k.lower() in src.lower():
-            return v
+    mechanism_map = cfg.get("mechanism_map", {})
+    if mechanism_map:
+        pattern, values = _mechanism_re(mechanism_map)
+        m = pattern.search(src)
+        if m:
+            return values[m.lastindex - 1]
     # Grants.gov link heuristic
     if "grants.gov" in (item.get("url","")).lower(): return "Grants.gov"
     return "Other"
 
-def prepare_rows(item: Dict, cfg: Dict, next_pid: str):
+# Days-before-due offsets used by the standard pre-award task set
+_TASK_OFFSETS = (10, 9, 8, 7)
+
+# Config-derived constants hoisted out of prepare_rows so the per-row work
+# is just field projection, not repeated dict lookups.
+RowDefaults = namedtuple("RowDefaults", ["pi_id", "pi_name", "pi_dept", "pi_college",
+                                         "offset", "proposal_type", "status", "note", "cfg"])
+
+def row_defaults(cfg: Dict) -> RowDefaults:
+    pi = cfg["default_pi"]
+    return RowDefaults(pi["id"], pi["name"], pi["dept"], pi["college"],
+                       datetime.timedelta(days=cfg.get("internal_deadline_offset_days", 7)),
+                       cfg.get("default_proposal_type", "New"),
+                       cfg.get("default_status", "Department Review"),
+                       f"Imported by BrassLoom on {datetime.date.today().isoformat()}",
+                       cfg)
+
+def prepare_rows(item: Dict, defaults: RowDefaults, next_pid: str):
     title = item.get("title","").strip()
     sponsor = (item.get("agency") or item.get("source") or "").strip()
     sponsor_type = sponsor_type_from_agency(sponsor)
@@ -76,78 +136,225 @@ def prepare_rows(item: Dict, cfg: Dict, next_pid: str):
     posted = parse_date(item.get("posted_date",""))
 
     due = close_date or posted
-    internal = due - datetime.timedelta(days=cfg.get("internal_deadline_offset_days", 7)) if due else None
+    internal = due - defaults.offset if due else None
 
     props_row = [
         next_pid,                          # ProposalID
         title,                             # Title
-        cfg["default_pi"]["id"],           # PI_ID
-        cfg["default_pi"]["name"],         # PI_Name
-        cfg["default_pi"]["dept"],         # Department
-        cfg["default_pi"]["college"],      # College/Unit
+        defaults.pi_id,                    # PI_ID
+        defaults.pi_name,                  # PI_Name
+        defaults.pi_dept,                  # Department
+        defaults.pi_college,               # College/Unit
         "",                                # SponsorID
         sponsor,                           # SponsorName
         sponsor_type,                      # SponsorType
         (item.get("id") or item.get("assistance_listing") or ""),  # FundingOpportunity
         internal.isoformat() if internal else "",                  # InternalDeadline
         due.isoformat() if due else "",                            # DueDate
-        mechanism_from_source(item, cfg),  # SubmissionMechanism
-        cfg.get("default_proposal_type","New"),                    # ProposalType
-        cfg.get("default_status","Department Review"),             # Status
+        mechanism_from_source(item, defaults.cfg),  # SubmissionMechanism
+        defaults.proposal_type,            # ProposalType
+        defaults.status,                   # Status
         "", "", "",                        # PrimeSponsorID, ProjectStart, ProjectEnd
         "", "", "",                        # TotalDirect, TotalIndirect, F&A_Rate
         "No", "", "",                      # CostShareRequired, Amount, Approvers
         "No","No","No","Yes","No","No",    # Human, Animal, Biosafety, COI, Export, DataSec
         0,                                 # SubawardsCount
-        f"Imported by BrassLoom on {datetime.date.today().isoformat()}"
+        defaults.note
     ]
 
     mechanism = props_row[12]
     due_for_tasks = due or (datetime.date.today() + datetime.timedelta(days=30))
-    def t(n): return (due_for_tasks - datetime.timedelta(days=n)).isoformat()
+    # Four distinct dates cover all seven tasks; compute each offset once
+    t = {n: (due_for_tasks - datetime.timedelta(days=n)).isoformat() for n in _TASK_OFFSETS}
 
     tasks = [
-        ("Complete GSU Internal Routing Form", t(10), "PI", "Pending", "Attach signed PDF"),
-        ("COI Disclosures for all key personnel", t(9), "PI/OSP", "Pending", ""),
-        ("Subrecipient Commitment Form(s)", t(8), "OSP", "Pending", "Collect UEI and F&A rate docs"),
-        ("Export Control & Data Security review", t(8), "Compliance", "Pending", "If foreign collaborators or controlled data"),
-        ("Final Budget & Justification", t(7), "OSP Pre-Award", "Pending", "Check salary cap and F&A base"),
-        (f"Create application in {mechanism}", t(7), "OSP Pre-Award", "Pending", "Confirm FOA & forms"),
-        ("Dean/Provost cost-share letter (if required)", t(7), "Dean/Provost", "Pending", "Upload letter")
+        ("Complete GSU Internal Routing Form", t[10], "PI", "Pending", "Attach signed PDF"),
+        ("COI Disclosures for all key personnel", t[9], "PI/OSP", "Pending", ""),
+        ("Subrecipient Commitment Form(s)", t[8], "OSP", "Pending", "Collect UEI and F&A rate docs"),
+        ("Export Control & Data Security review", t[8], "Compliance", "Pending", "If foreign collaborators or controlled data"),
+        ("Final Budget & Justification", t[7], "OSP Pre-Award", "Pending", "Check salary cap and F&A base"),
+        (f"Create application in {mechanism}", t[7], "OSP Pre-Award", "Pending", "Confirm FOA & forms"),
+        ("Dean/Provost cost-share letter (if required)", t[7], "Dean/Provost", "Pending", "Upload letter")
     ]
     return props_row, tasks
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--ops", default=os.path.join(os.path.dirname(__file__), "opportunities.json"))
-    ap.add_argument("--wb", default=os.path.join(os.path.dirname(__file__), "GSU_Cayuse_Lite.xlsx"))
-    ap.add_argument("--filter", default="")  # comma-separated keywords to restrict import
-    ap.add_argument("--all", action="store_true")
-    args = ap.parse_args()
+_SSML = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_RELS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+def sheet_metadata(path: str) -> Dict:
+    """Per-sheet column widths and data validations from the workbook XML.
+
+    openpyxl's read-only mode exposes neither, so pull them straight from
+    the sheet XML (tiny elements, no cell data parsed) and hand them to
+    write_workbook so the rewrite carries the template's dropdowns and
+    layout. Returns {sheet title: (widths, validations)} where widths is
+    [(min_col, max_col, width)] and validations is a list of attribute
+    dicts with the ranges they cover.
+    """
+    meta = {}
+    with zipfile.ZipFile(path) as z:
+        rels = ET.fromstring(z.read("xl/_rels/workbook.xml.rels"))
+        targets = {r.get("Id"): r.get("Target") for r in rels}
+        wb_root = ET.fromstring(z.read("xl/workbook.xml"))
+        for sheet in wb_root.find(f"{_SSML}sheets"):
+            member = targets[sheet.get(f"{_RELS}id")].lstrip("/")
+            if not member.startswith("xl/"):
+                member = "xl/" + member
+            root = ET.fromstring(z.read(member))
+            widths = []
+            cols = root.find(f"{_SSML}cols")
+            if cols is not None:
+                widths = [(int(c.get("min")), int(c.get("max")), float(c.get("width")))
+                          for c in cols if c.get("width")]
+            validations = []
+            dv_block = root.find(f"{_SSML}dataValidations")
+            if dv_block is not None:
+                for dv in dv_block:
+                    f1 = dv.find(f"{_SSML}formula1")
+                    f2 = dv.find(f"{_SSML}formula2")
+                    validations.append({
+                        "type": dv.get("type"),
+                        "operator": dv.get("operator"),
+                        "formula1": f1.text if f1 is not None else None,
+                        "formula2": f2.text if f2 is not None else None,
+                        "allowBlank": dv.get("allowBlank") == "1",
+                        "showDropDown": dv.get("showDropDown") == "1",
+                        "showInputMessage": dv.get("showInputMessage") == "1",
+                        "showErrorMessage": dv.get("showErrorMessage") == "1",
+                        "promptTitle": dv.get("promptTitle"),
+                        "prompt": dv.get("prompt"),
+                        "errorTitle": dv.get("errorTitle"),
+                        "error": dv.get("error"),
+                        "errorStyle": dv.get("errorStyle"),
+                        "ranges": dv.get("sqref", "").split(),
+                    })
+            meta[sheet.get("name")] = (widths, validations)
+    return meta
+
+def write_workbook(path: str, new_prop_rows: List[list], new_task_rows: List[list], engine: str = "openpyxl"):
+    """Rewrite the workbook, appending the new rows.
+
+    Streams every sheet row-by-row from a read-only handle into a fresh
+    replacement file, so memory stays near-constant instead of loading
+    the full cell grid just to append a handful of rows. Column widths
+    and data validations are carried over via sheet_metadata; the
+    template has no other formatting to lose. engine is "openpyxl"
+    (write-only mode) or "xlsxwriter" (constant_memory mode, roughly 2x
+    faster to write and close on large sheets).
+    """
+    if engine == "xlsxwriter" and xlsxwriter is None:
+        raise SystemExit("xlsxwriter engine requested but the package is not installed")
+    meta = sheet_metadata(path)
+    wb_ro = load_workbook(path, read_only=True)
+    if engine == "xlsxwriter":
+        wb_out = xlsxwriter.Workbook(path, {"constant_memory": True})
+        def add_sheet(title, state):
+            ws = wb_out.add_worksheet(title)
+            if state != "visible":
+                ws.hide()
+            widths, validations = meta.get(title, ((), ()))
+            for cmin, cmax, width in widths:
+                # xlsxwriter adds its cell-padding allowance (0.711 chars)
+                # on write; subtract it so the stored width matches the source
+                ws.set_column(cmin - 1, cmax - 1, max(width - 0.7109375, 0))
+            for v in validations:
+                opts = {"validate": v["type"] or "any"}
+                if v["type"] == "list":
+                    # a leading "=" marks the source as a range, not a literal
+                    src = v["formula1"] or ""
+                    opts["source"] = src if src.startswith("=") else "=" + src
+                elif v["formula1"]:
+                    opts["criteria"] = v["operator"] or "between"
+                    opts["value"] = v["formula1"]
+                    if v["formula2"]:
+                        opts["minimum"], opts["maximum"] = v["formula1"], v["formula2"]
+                        del opts["value"]
+                opts["ignore_blank"] = v["allowBlank"]
+                opts["dropdown"] = not v["showDropDown"]  # OOXML flag is inverted
+                opts["show_input"] = v["showInputMessage"]
+                opts["show_error"] = v["showErrorMessage"]
+                if v["errorStyle"] in ("warning", "information"):
+                    opts["error_type"] = v["errorStyle"]
+                for attr, opt in (("promptTitle", "input_title"), ("prompt", "input_message"),
+                                  ("errorTitle", "error_title"), ("error", "error_message")):
+                    if v[attr]:
+                        opts[opt] = v[attr]
+                for rng in v["ranges"]:
+                    ws.data_validation(rng, opts)
+            counter = [0]
+            def write(row):
+                ws.write_row(counter[0], 0, row)
+                counter[0] += 1
+            return write
+    else:
+        wb_out = Workbook(write_only=True)
+        def add_sheet(title, state):
+            ws = wb_out.create_sheet(title)
+            ws.sheet_state = state
+            widths, validations = meta.get(title, ((), ()))
+            for cmin, cmax, width in widths:
+                for idx in range(cmin, cmax + 1):
+                    ws.column_dimensions[get_column_letter(idx)].width = width
+            for v in validations:
+                dv = DataValidation(type=v["type"], operator=v["operator"],
+                                    formula1=v["formula1"], formula2=v["formula2"],
+                                    allowBlank=v["allowBlank"], showDropDown=v["showDropDown"],
+                                    showInputMessage=v["showInputMessage"],
+                                    showErrorMessage=v["showErrorMessage"],
+                                    promptTitle=v["promptTitle"], prompt=v["prompt"],
+                                    errorTitle=v["errorTitle"], error=v["error"],
+                                    errorStyle=v["errorStyle"])
+                for rng in v["ranges"]:
+                    dv.add(rng)
+                # WriteOnlyWorksheet has no add_data_validation helper
+                ws.data_validations.append(dv)
+            return ws.append
+    appended = {"Proposals": new_prop_rows, "Tasks": new_task_rows}
+    for ws_ro in wb_ro.worksheets:
+        write_row = add_sheet(ws_ro.title, ws_ro.sheet_state)
+        for row in itertools.chain(ws_ro.iter_rows(values_only=True),
+                                   appended.get(ws_ro.title, ())):
+            write_row(row)
+    wb_ro.close()
+    if engine == "xlsxwriter":
+        # hide() is ignored on the active sheet (sheet 0 by default), so
+        # activate the first visible sheet before closing
+        for ws in wb_out.worksheets():
+            if not ws.hidden:
+                ws.activate()
+                break
+        wb_out.close()
+    else:
+        wb_out.save(path)
 
+def run(args, ops=None):
     cfg = load_config()
 
-    with open(args.ops, "r", encoding="utf-8") as f:
-        ops = json.load(f)
+    if ops is None:
+        if orjson is not None:
+            with open(args.ops, "rb") as f:
+                ops = orjson.loads(f.read())
+        else:
+            with open(args.ops, "r", encoding="utf-8") as f:
+                ops = json.load(f)
 
     if not os.path.exists(args.wb):
         raise SystemExit(f"Workbook not found: {args.wb}")
 
-    wb = load_workbook(args.wb)
-    wsP = wb["Proposals"]
-    wsT = wb["Tasks"]
-
-    existing_titles = set()
+    # Scan pass: read-only mode keeps memory constant regardless of workbook size
+    wb_ro = load_workbook(args.wb, read_only=True, data_only=True)
+    seen_keys = set()
     existing_ids = []
-    for row in wsP.iter_rows(min_row=2, values_only=True):
+    for row in wb_ro["Proposals"].iter_rows(min_row=2, values_only=True):
         if not any(row): continue
         existing_ids.append(str(row[0]))
-        if row[1]: existing_titles.add(str(row[1]).strip().lower())
+        if row[1]: seen_keys.add(opp_key(row[9], row[1]))
 
     next_pid = next_id(existing_ids, "GSU-P-")
 
-    task_ids = [r[0] for r in wsT.iter_rows(min_row=2, values_only=True) if r and r[0]]
+    task_ids = [r[0] for r in wb_ro["Tasks"].iter_rows(min_row=2, values_only=True) if r and r[0]]
     next_task = next_task_id(task_ids)
+    wb_ro.close()
 
     chosen = []
     if args.all:
@@ -157,32 +364,45 @@ def main():
         if not flt:
             # default: import only items containing HBCU/MSI keywords
             flt = [k.lower() for k in cfg["keywords"]]
+        # One compiled alternation over just the searchable fields beats
+        # serializing every item to JSON for a substring scan
+        flt_re = re.compile("|".join(re.escape(k) for k in flt), re.I)
         for o in ops:
-            blob = json.dumps(o).lower()
-            if any(k in blob for k in flt):
+            text = " ".join(str(o.get(f, "")) for f in ("title", "description", "agency", "eligibility", "source"))
+            if flt_re.search(text):
                 chosen.append(o)
 
-    added = 0
+    defaults = row_defaults(cfg)
+    new_prop_rows = []
+    new_task_rows = []
     for item in chosen:
-        title = (item.get("title") or "").strip().lower()
-        if not title or title in existing_titles:
+        title = (item.get("title") or "").strip()
+        key = opp_key(item.get("id") or item.get("assistance_listing") or "", title)
+        if not title or key in seen_keys:
             continue
-        prop_row, tasks = prepare_rows(item, cfg, next_pid)
-        wsP.append(prop_row)
-
-        for name, due, owner, status, notes in tasks:
-            wsT.append([next_task(), prop_row[0], name, due, owner, status, notes])
-
-        existing_titles.add(title)
-        existing_ids.append(next_pid)
-        # increment proposal id for next one
-        m = re.match(r"GSU-P-(\d+)", next_pid)
-        nxt = int(m.group(1)) + 1 if m else 1
-        next_pid = f"GSU-P-{nxt:04d}"
-        added += 1
-
-    wb.save(args.wb)
-    print(f"Imported {added} opportunities into {os.path.basename(args.wb)}")
+        prop_row, tasks = prepare_rows(item, defaults, next_pid())
+        new_prop_rows.append(prop_row)
+        new_task_rows.extend([next_task(), prop_row[0], name, due, owner, status, notes]
+                             for name, due, owner, status, notes in tasks)
+        seen_keys.add(key)
+
+    added = len(new_prop_rows)
+    if added:
+        write_workbook(args.wb, new_prop_rows, new_task_rows, getattr(args, "engine", "openpyxl"))
+        print(f"Imported {added} opportunities into {os.path.basename(args.wb)}")
+    else:
+        print(f"No new opportunities; {os.path.basename(args.wb)} unchanged")
+
+def main(args=None):
+    if args is None:
+        ap = argparse.ArgumentParser()
+        ap.add_argument("--ops", default=os.path.join(os.path.dirname(__file__), "opportunities.json"))
+        ap.add_argument("--wb", default=os.path.join(os.path.dirname(__file__), "GSU_Cayuse_Lite.xlsx"))
+        ap.add_argument("--filter", default="")  # comma-separated keywords to restrict import
+        ap.add_argument("--all", action="store_true")
+        ap.add_argument("--engine", choices=["openpyxl", "xlsxwriter"], default="openpyxl")
+        args = ap.parse_args()
+    return run(args)
 
 if __name__ == "__main__":
     main()